@@ -0,0 +1,18 @@
+import httpx
+from groq import Groq
+from config import GROQ_API_KEY
+
+# One Groq client shared by every agent, so all calls reuse the same
+# keep-alive connection pool instead of each agent paying its own TLS
+# handshake on first use. The pool is sized for the orchestrator's peak
+# fan-out: get_inbox_overview keeps up to 32 messages in flight, and each
+# makes up to four model calls at once (sentiment, signals, lead score and
+# suggestions).
+CLIENT = Groq(
+    api_key=GROQ_API_KEY,
+    max_retries=2,
+    timeout=20,
+    http_client=httpx.Client(
+        limits=httpx.Limits(max_connections=128, max_keepalive_connections=32, keepalive_expiry=60),
+    ),
+)
@@ -38,14 +38,16 @@ FAQ = {
     "refund_policy": "Please contact us to discuss refund options",
 }
 
-# Build pricing text for AI context
-def get_pricing_text():
+# Build pricing text for AI context. The text only depends on the constants
+# above, so it is built once at import; every prompt then gets byte-identical
+# business context.
+def _build_pricing_text():
     text = "PRICING:\n"
     for service, info in PRICING.items():
         text += f"- {service.replace('_', ' ').title()}: {info['price']}\n"
     return text
 
-def get_faq_text():
+def _build_faq_text():
     text = "FAQ:\n"
     text += f"- Delivery time: {FAQ['delivery_time']}\n"
     text += f"- Revisions: {FAQ['revisions']}\n"
@@ -53,11 +55,51 @@ def get_faq_text():
     text += f"- Rush orders: {FAQ['rush_orders']}\n"
     return text
 
-def get_full_context():
+def _build_full_context():
     return f"""
 Business: {BUSINESS_INFO['name']}
 Services: {BUSINESS_INFO['services']}
 
-{get_pricing_text()}
-{get_faq_text()}
+{_PRICING_TEXT}
+{_FAQ_TEXT}
 """
+
+_PRICING_TEXT = _build_pricing_text()
+_FAQ_TEXT = _build_faq_text()
+_FULL_CONTEXT = _build_full_context()
+
+def get_pricing_text():
+    return _PRICING_TEXT
+
+def get_faq_text():
+    return _FAQ_TEXT
+
+def get_full_context():
+    return _FULL_CONTEXT
+
+# Canned answers for common DMs, used to pre-seed the reply cache.
+# Each entry is (question, answer, kind); kind is "pricing" or "faq".
+def get_canned_replies():
+    replies = []
+    for service, info in PRICING.items():
+        if service == "other":
+            continue
+        name = info["description"].replace("Custom ", "").replace(" design", "")
+        answer = (
+            f"{info['description']}s are {info['price']}, "
+            f"with {FAQ['revisions']} and delivery in {FAQ['delivery_time']}. "
+            "Would you like to see some examples?"
+        )
+        replies.append((f"How much for a {name}?", answer, "pricing"))
+        replies.append((f"How much is a {name}?", answer, "pricing"))
+        replies.append((f"{name} price", answer, "pricing"))
+
+    faq_replies = {
+        "What's the delivery time?": f"Delivery takes {FAQ['delivery_time']}. {FAQ['rush_orders']}.",
+        "Do you offer revisions?": f"Yes! {FAQ['revisions']} with every order.",
+        "What payment methods do you accept?": f"We accept {FAQ['payment_methods']}.",
+        "Do you do rush orders?": f"{FAQ['rush_orders']}. Standard delivery is {FAQ['delivery_time']}.",
+    }
+    for question, answer in faq_replies.items():
+        replies.append((question, answer, "faq"))
+    return replies
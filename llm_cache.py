@@ -0,0 +1,118 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# orjson parses model replies faster; every agent imports _json_loads from here
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+except ImportError:
+    _json_loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True).encode()
+
+# Completions kept for repeated identical requests across all agents.
+LLM_CACHE_SIZE = 8192
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _request_key(request: dict) -> str:
+    return hashlib.blake2b(_dumps(request), digest_size=16).hexdigest()
+
+
+def json_object_with(*keys):
+    """Return a chat() validator accepting a JSON object that has ``keys``."""
+    def validate(content: str) -> bool:
+        try:
+            parsed = _json_loads(content)
+        except (json.JSONDecodeError, TypeError):
+            return False
+        return isinstance(parsed, dict) and all(key in parsed for key in keys)
+    return validate
+
+
+def chat(client, cache: bool = True, validate=None, **request) -> str:
+    """Run a chat completion and return the message content.
+
+    Identical requests (same model, messages and options) are answered from
+    an in-process LRU. Pass cache=False for requests that should always be
+    sampled fresh. Replies cut off by max_tokens are never cached, and when
+    ``validate`` is given, only content for which it returns True is, so a
+    garbled reply is retried on the next call instead of being replayed.
+    """
+    key = None
+    if cache:
+        key = _request_key(request)
+        with _lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+
+    response = client.chat.completions.create(**request)
+    choice = response.choices[0]
+    content = choice.message.content
+
+    if (
+        key is not None
+        and content is not None
+        and getattr(choice, "finish_reason", None) != "length"
+        and (validate is None or validate(content))
+    ):
+        with _lock:
+            _cache[key] = content
+            while len(_cache) > LLM_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return content
+
+
+def format_batch_rows(rows: list) -> str:
+    """Number ``rows`` with "--- ROW i ---" separators for a batched prompt.
+
+    The text asks for a JSON object whose "results" array holds one object
+    per row; read the reply back with match_batch_rows.
+    """
+    rows_text = "\n".join(f"--- ROW {i} ---\n{row}" for i, row in enumerate(rows, 1))
+    return f"""Each row starts with a "--- ROW i ---" separator.
+Output a JSON object with a "results" array of exactly {len(rows)} objects,
+one per row, in row order. Each object must include a "row" field with its row number.
+
+{rows_text}"""
+
+
+def match_batch_rows(parsed, count: int) -> dict:
+    """Map row numbers 1..count to the items of a batched "results" array.
+
+    Accepts ``row`` as an int or a numeric string. When the reply has exactly
+    one item per row, items without a usable row number are matched by
+    position instead.
+    """
+    items = [item for item in parsed if isinstance(item, dict)] if isinstance(parsed, list) else []
+    by_row = {}
+    unnumbered = []
+    for position, item in enumerate(items, 1):
+        try:
+            row = int(item.get("row"))
+        except (TypeError, ValueError):
+            unnumbered.append((position, item))
+            continue
+        if 1 <= row <= count:
+            by_row.setdefault(row, item)
+
+    if len(items) == count:
+        for position, item in unnumbered:
+            by_row.setdefault(position, item)
+    return by_row
+
+
+
+def clear():
+    """Drop every cached completion."""
+    with _lock:
+        _cache.clear()
@@ -5,7 +5,15 @@ Instagram Agent Skills - Main Entry Point
 A collection of 5 AI-powered agents for streamlining Instagram business communication.
 """
 
+import atexit
+import functools
+import hashlib
 import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
 from datetime import datetime
 from agents import (
     AgentOrchestrator,
@@ -15,35 +23,177 @@ from agents import (
     LeadQualifierAgent,
     MemoryAgent,
 )
-from business_config import BUSINESS_INFO, get_pricing_text, get_faq_text
+import business_config
+from business_config import BUSINESS_INFO, get_pricing_text, get_faq_text, get_canned_replies
+from agents.semantic_cache import normalize_text
+
+# Clipboard tools that read the text from stdin, probed once at startup.
+# Windows is left to pyperclip, since clip.exe does not read UTF-8.
+_CLIPBOARD_COMMANDS = [
+    ["pbcopy"],
+    ["wl-copy"],
+    ["xclip", "-selection", "clipboard"],
+    ["xsel", "--clipboard", "--input"],
+]
+CLIPBOARD_COMMAND = next(
+    (cmd for cmd in _CLIPBOARD_COMMANDS if shutil.which(cmd[0])), None
+)
 
-# Try to import pyperclip for clipboard support
+# Try to import pyperclip as a fallback for clipboard support
 try:
     import pyperclip
-    CLIPBOARD_AVAILABLE = True
+    PYPERCLIP_AVAILABLE = True
+except ImportError:
+    PYPERCLIP_AVAILABLE = False
+
+CLIPBOARD_AVAILABLE = CLIPBOARD_COMMAND is not None or PYPERCLIP_AVAILABLE
+
+# Try to import diskcache for the reply cache
+try:
+    import diskcache
+    REPLY_CACHE_AVAILABLE = True
 except ImportError:
-    CLIPBOARD_AVAILABLE = False
+    REPLY_CACHE_AVAILABLE = False
+
+LOG_DIR = "logs"
+LOG_FILE = os.path.join(LOG_DIR, "conversations.log")
+LOG_FLUSH_INTERVAL = 0.1  # seconds to gather entries before a write
+LOG_BATCH_SIZE = 64
+
+REPLY_CACHE_DIR = "cache"
 
 
 def copy_to_clipboard(text):
     """Copy text to clipboard if available."""
-    if CLIPBOARD_AVAILABLE:
+    if CLIPBOARD_COMMAND:
+        try:
+            subprocess.run(CLIPBOARD_COMMAND, input=text.encode("utf-8"), check=True, timeout=2)
+            return True
+        except (OSError, subprocess.SubprocessError):
+            pass
+    if PYPERCLIP_AVAILABLE:
         try:
             pyperclip.copy(text)
             return True
-        except:
+        except pyperclip.PyperclipException:
             return False
     return False
 
 
-def log_conversation(client_id, message, reply, sentiment, lead_score):
-    """Save conversation to log file."""
-    log_dir = "logs"
-    log_file = os.path.join(log_dir, "conversations.log")
+def reply_cache_key(message):
+    """Hash a message after lowercasing and stripping punctuation."""
+    return hashlib.sha1(normalize_text(message).encode("utf-8")).hexdigest()
+
+
+def open_reply_cache():
+    """Open the on-disk reply cache and seed it with canned FAQ/pricing answers.
+
+    Canned replies do not expire on a timer, since only seeded entries are
+    ever served; they are evicted and re-seeded whenever business_config.py
+    has been edited since the cache was last seeded.
+    """
+    cache = diskcache.Cache(REPLY_CACHE_DIR)
+
+    config_mtime = os.path.getmtime(business_config.__file__)
+    if cache.get("business_config_mtime") != config_mtime:
+        cache.evict("reply")
+        cache.set("business_config_mtime", config_mtime)
+
+    for question, answer, _kind in get_canned_replies():
+        key = reply_cache_key(question)
+        if key not in cache:
+            reply = {
+                "detected_language": "en",
+                "sentiment": "neutral",
+                "priority": 3,
+                "lead_score": "warm",
+                "auto_reply": answer,
+            }
+            cache.set(key, reply, tag="reply")
+
+    return cache
+
+
+def with_reply_cache(orchestrator):
+    """Wrap orchestrator.auto_reply so canned FAQ/pricing DMs are answered from the cache.
+
+    Only the seeded canned replies are served. Generated replies depend on
+    the client's history, language and lead state, so they are never cached
+    for reuse by other clients. Returns orchestrator.auto_reply unchanged if
+    diskcache is not installed.
+    """
+    if not REPLY_CACHE_AVAILABLE:
+        return orchestrator.auto_reply
 
-    # Ensure logs directory exists
-    os.makedirs(log_dir, exist_ok=True)
+    cache = open_reply_cache()
 
+    @functools.wraps(orchestrator.auto_reply)
+    def auto_reply(message, client_id, **kwargs):
+        key = reply_cache_key(message)
+        cached = cache.get(key)
+        if cached is not None:
+            orchestrator.memory.save_messages_bulk(client_id, [(message, cached["auto_reply"])])
+            return dict(cached, client_id=client_id, original_message=message)
+
+        return orchestrator.auto_reply(message=message, client_id=client_id, **kwargs)
+
+    return auto_reply
+
+
+# Log entries are written by a background thread so the reply loop never
+# waits on file IO.
+_LOG_Q = queue.Queue()
+_LOG_STOP = object()
+
+
+def _drain_log_queue():
+    """Append queued log entries to the log file in batches."""
+    while True:
+        entries = [_LOG_Q.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while entries[-1] is not _LOG_STOP and len(entries) < LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entries.append(_LOG_Q.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        stop = entries[-1] is _LOG_STOP
+        text = "".join(entry for entry in entries if entry is not _LOG_STOP)
+        try:
+            if text:
+                os.makedirs(LOG_DIR, exist_ok=True)
+                with open(LOG_FILE, "a", encoding="utf-8") as f:
+                    f.write(text)
+        except OSError as e:
+            # Keep the writer alive; a dead thread would hang flush_logs()
+            print(f"[LOG] Could not write {LOG_FILE}: {e}")
+        finally:
+            for _ in entries:
+                _LOG_Q.task_done()
+        if stop:
+            return
+
+
+_LOG_WRITER = threading.Thread(target=_drain_log_queue, daemon=True)
+_LOG_WRITER.start()
+
+
+def flush_logs():
+    """Block until every queued log entry has been written."""
+    _LOG_Q.join()
+
+
+@atexit.register
+def _stop_log_writer():
+    _LOG_Q.put(_LOG_STOP)
+    _LOG_WRITER.join()
+
+
+def log_conversation(client_id, message, reply, sentiment, lead_score):
+    """Queue a conversation entry for the log file."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     log_entry = f"""
@@ -56,8 +206,7 @@ BOT: {reply}
 {'='*60}
 """
 
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    _LOG_Q.put(log_entry)
 
 
 def demo():
@@ -68,6 +217,7 @@ def demo():
 
     # Initialize orchestrator (loads all agents)
     orchestrator = AgentOrchestrator()
+    auto_reply = with_reply_cache(orchestrator)
 
     # Example incoming messages
     test_messages = [
@@ -95,7 +245,7 @@ def demo():
         print(f"Message: {msg['content']}")
 
         # Get automatic reply
-        result = orchestrator.auto_reply(
+        result = auto_reply(
             message=msg["content"],
             client_id=msg["client_id"],
         )
@@ -121,6 +271,7 @@ def demo():
 def auto_reply_mode():
     """Auto-reply mode - generates automatic responses."""
     orchestrator = AgentOrchestrator()
+    auto_reply = with_reply_cache(orchestrator)
 
     print("\n" + "=" * 60)
     print("amilie - Instagram Auto Reply Bot")
@@ -154,8 +305,9 @@ def auto_reply_mode():
 
         if message.lower() == "logs":
             print("\n--- Recent Conversations ---")
+            flush_logs()
             try:
-                with open("logs/conversations.log", "r", encoding="utf-8") as f:
+                with open(LOG_FILE, "r", encoding="utf-8") as f:
                     lines = f.readlines()
                     # Show last 30 lines
                     print("".join(lines[-30:]))
@@ -167,7 +319,7 @@ def auto_reply_mode():
             continue
 
         # Generate automatic reply
-        result = orchestrator.auto_reply(
+        result = auto_reply(
             message=message,
             client_id=client_id,
         )
@@ -1,6 +1,8 @@
 import json
+import re
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from config import DATABASE_PATH
 
@@ -11,12 +13,44 @@ class MemoryAgent:
     def __init__(self):
         self.db_path = DATABASE_PATH
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
         self._init_database()
 
+    @property
+    def _conn(self):
+        """Per-thread persistent connection, opened and configured on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-64000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        """Run the enclosed statements in one transaction.
+
+        IMMEDIATE (the default) takes the write lock up front; DEFERRED is
+        enough for a consistent read snapshot. Nested uses join the outer
+        transaction.
+        """
+        conn = self._conn
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute(f"BEGIN {mode}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
     def _init_database(self):
         """Initialize SQLite database with required tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS clients (
@@ -41,6 +75,22 @@ class MemoryAgent:
             )
         """)
 
+        # One row per (client_id, key). Databases created before the unique
+        # index may hold duplicates; keep the newest before building it.
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_client_details'"
+        )
+        if not cursor.fetchone():
+            cursor.execute("""
+                DELETE FROM client_details WHERE id NOT IN (
+                    SELECT MAX(id) FROM client_details GROUP BY client_id, key
+                )
+            """)
+            cursor.execute("""
+                CREATE UNIQUE INDEX ux_client_details
+                ON client_details(client_id, key)
+            """)
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS conversations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,6 +102,18 @@ class MemoryAgent:
                 FOREIGN KEY (client_id) REFERENCES clients(client_id)
             )
         """)
+        # Covers get_history's ORDER BY timestamp DESC, id DESC. Databases
+        # created before the id tiebreak have the index without it; rebuild.
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'ix_conv_client_ts'"
+        )
+        row = cursor.fetchone()
+        if row and "id DESC" not in row[0]:
+            cursor.execute("DROP INDEX ix_conv_client_ts")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_conv_client_ts
+            ON conversations(client_id, timestamp DESC, id DESC)
+        """)
 
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS orders (
@@ -64,50 +126,88 @@ class MemoryAgent:
                 FOREIGN KEY (client_id) REFERENCES clients(client_id)
             )
         """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_orders_client_ts
+            ON orders(client_id, created_at DESC)
+        """)
+
+        # Full-text index over client names and detail values. Rows share the
+        # clients rowid and are kept in sync by triggers.
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clients_fts'"
+        )
+        fts_exists = cursor.fetchone() is not None
+
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                client_id, name, details,
+                tokenize = 'porter unicode61'
+            )
+        """)
 
-        conn.commit()
-        conn.close()
+        refresh_fts = """
+                DELETE FROM clients_fts
+                WHERE rowid = (SELECT rowid FROM clients WHERE client_id = {ref}.client_id);
+                INSERT INTO clients_fts (rowid, client_id, name, details)
+                SELECT c.rowid, c.client_id, c.name,
+                       (SELECT group_concat(d.value, ' ') FROM client_details d
+                        WHERE d.client_id = c.client_id)
+                FROM clients c WHERE c.client_id = {ref}.client_id;
+        """
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+                {refresh_fts.format(ref="new")}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF name ON clients
+            WHEN new.name IS NOT old.name BEGIN
+                {refresh_fts.format(ref="new")}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS client_details_fts_ai AFTER INSERT ON client_details BEGIN
+                {refresh_fts.format(ref="new")}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS client_details_fts_au AFTER UPDATE OF value ON client_details
+            WHEN new.value IS NOT old.value BEGIN
+                {refresh_fts.format(ref="new")}
+            END
+        """)
 
-    def _get_conn(self):
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
+        if not fts_exists:
+            cursor.execute("""
+                INSERT INTO clients_fts (rowid, client_id, name, details)
+                SELECT c.rowid, c.client_id, c.name,
+                       (SELECT group_concat(d.value, ' ') FROM client_details d
+                        WHERE d.client_id = c.client_id)
+                FROM clients c
+            """)
 
     def save_client(self, client_id: str, name: str = None, language: str = None):
         """Create or update a client profile."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
             INSERT INTO clients (client_id, name, language, last_contact)
-            VALUES (?, ?, ?, ?)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
             ON CONFLICT(client_id) DO UPDATE SET
-                name = COALESCE(?, name),
-                language = COALESCE(?, language),
-                last_contact = ?
+                name = COALESCE(excluded.name, name),
+                language = COALESCE(excluded.language, language),
+                last_contact = CURRENT_TIMESTAMP
         """,
-            (
-                client_id,
-                name,
-                language,
-                datetime.now(),
-                name,
-                language,
-                datetime.now(),
-            ),
+            (client_id, name, language),
         )
 
-        conn.commit()
-        conn.close()
-
     def get_client(self, client_id: str) -> dict:
         """Get client profile."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute("SELECT * FROM clients WHERE client_id = ?", (client_id,))
         row = cursor.fetchone()
-        conn.close()
 
         if row:
             return {
@@ -123,44 +223,26 @@ class MemoryAgent:
 
     def save_detail(self, client_id: str, key: str, value: str):
         """Save a specific detail about a client."""
-        self.save_client(client_id)  # Ensure client exists
-
-        conn = self._get_conn()
-        cursor = conn.cursor()
-
-        # Check if key exists, update or insert
-        cursor.execute(
-            """
-            SELECT id FROM client_details
-            WHERE client_id = ? AND key = ?
-        """,
-            (client_id, key),
-        )
-
-        if cursor.fetchone():
-            cursor.execute(
-                """
-                UPDATE client_details SET value = ?, created_at = ?
-                WHERE client_id = ? AND key = ?
-            """,
-                (value, datetime.now(), client_id, key),
+        with self._transaction() as conn:
+            # Make sure the client row exists without bumping last_contact
+            conn.execute(
+                "INSERT OR IGNORE INTO clients (client_id) VALUES (?)",
+                (client_id,),
             )
-        else:
-            cursor.execute(
+            conn.execute(
                 """
                 INSERT INTO client_details (client_id, key, value)
                 VALUES (?, ?, ?)
+                ON CONFLICT(client_id, key) DO UPDATE SET
+                    value = excluded.value,
+                    created_at = CURRENT_TIMESTAMP
             """,
                 (client_id, key, value),
             )
 
-        conn.commit()
-        conn.close()
-
     def get_detail(self, client_id: str, key: str) -> str:
         """Get a specific detail about a client."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
@@ -172,62 +254,77 @@ class MemoryAgent:
         )
 
         row = cursor.fetchone()
-        conn.close()
 
         return row[0] if row else None
 
     def get_all_details(self, client_id: str) -> dict:
         """Get all stored details for a client."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
             SELECT key, value FROM client_details
             WHERE client_id = ?
+            ORDER BY key
         """,
             (client_id,),
         )
 
         rows = cursor.fetchall()
-        conn.close()
 
         return {row[0]: row[1] for row in rows}
 
     def save_message(self, client_id: str, role: str, content: str, platform: str = "instagram"):
         """Save a conversation message."""
-        self.save_client(client_id)
+        with self._transaction() as conn:
+            self.save_client(client_id)
 
-        conn = self._get_conn()
-        cursor = conn.cursor()
+            cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            INSERT INTO conversations (client_id, role, content, platform)
-            VALUES (?, ?, ?, ?)
-        """,
-            (client_id, role, content, platform),
-        )
+            cursor.execute(
+                """
+                INSERT INTO conversations (client_id, role, content, platform)
+                VALUES (?, ?, ?, ?)
+            """,
+                (client_id, role, content, platform),
+            )
 
-        conn.commit()
-        conn.close()
+    def save_messages_bulk(self, client_id: str, pairs: list, platform: str = "instagram"):
+        """Save (client_message, reply) pairs in one transaction.
+
+        Messages are stored in order, each client message followed by its
+        reply. A reply of None stores only the client message.
+        """
+        rows = []
+        for client_message, reply in pairs:
+            rows.append((client_id, "client", client_message, platform))
+            if reply is not None:
+                rows.append((client_id, "assistant", reply, platform))
+
+        with self._transaction() as conn:
+            self.save_client(client_id)
+            conn.executemany(
+                """
+                INSERT INTO conversations (client_id, role, content, platform)
+                VALUES (?, ?, ?, ?)
+            """,
+                rows,
+            )
 
     def get_history(self, client_id: str, limit: int = 20) -> list:
         """Get conversation history for a client."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
             SELECT role, content, timestamp FROM conversations
             WHERE client_id = ?
-            ORDER BY timestamp DESC LIMIT ?
+            ORDER BY timestamp DESC, id DESC LIMIT ?
         """,
             (client_id, limit),
         )
 
         rows = cursor.fetchall()
-        conn.close()
 
         # Return in chronological order
         return [
@@ -237,10 +334,15 @@ class MemoryAgent:
 
     def get_context(self, client_id: str) -> dict:
         """Get full context for a client before responding."""
-        client = self.get_client(client_id)
-        details = self.get_all_details(client_id)
-        history = self.get_history(client_id, limit=10)
-        orders = self.get_orders(client_id)
+        return self.get_context_bulk(client_id)
+
+    def get_context_bulk(self, client_id: str) -> dict:
+        """Fetch profile, details, history and orders from one read snapshot."""
+        with self._transaction("DEFERRED"):
+            client = self.get_client(client_id)
+            details = self.get_all_details(client_id)
+            history = self.get_history(client_id, limit=10)
+            orders = self.get_orders(client_id)
 
         context = {
             "client": client,
@@ -281,26 +383,22 @@ class MemoryAgent:
 
     def save_order(self, client_id: str, product: str, amount: float, status: str = "pending"):
         """Save an order for a client."""
-        self.save_client(client_id)
-
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        with self._transaction() as conn:
+            self.save_client(client_id)
 
-        cursor.execute(
-            """
-            INSERT INTO orders (client_id, product, amount, status)
-            VALUES (?, ?, ?, ?)
-        """,
-            (client_id, product, amount, status),
-        )
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute(
+                """
+                INSERT INTO orders (client_id, product, amount, status)
+                VALUES (?, ?, ?, ?)
+            """,
+                (client_id, product, amount, status),
+            )
 
     def get_orders(self, client_id: str) -> list:
         """Get order history for a client."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
@@ -312,7 +410,6 @@ class MemoryAgent:
         )
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [
             {
@@ -326,8 +423,7 @@ class MemoryAgent:
 
     def update_lead_score(self, client_id: str, score: str):
         """Update the lead score for a client."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
@@ -336,33 +432,38 @@ class MemoryAgent:
             (score, client_id),
         )
 
-        conn.commit()
-        conn.close()
-
     def search_clients(self, query: str) -> list:
-        """Search clients by name or details."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
+        """Search clients by name, client ID or details.
+
+        Each word in the query is matched as a (Porter-stemmed) token prefix.
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+
+        cursor = self._conn.cursor()
 
         cursor.execute(
             """
-            SELECT DISTINCT c.* FROM clients c
-            LEFT JOIN client_details d ON c.client_id = d.client_id
-            WHERE c.name LIKE ? OR c.client_id LIKE ? OR d.value LIKE ?
+            SELECT c.client_id, c.name, c.language, c.last_contact, c.lead_score
+            FROM clients_fts f
+            JOIN clients c ON c.rowid = f.rowid
+            WHERE clients_fts MATCH ?
+            ORDER BY f.rank
         """,
-            (f"%{query}%", f"%{query}%", f"%{query}%"),
+            (match,),
         )
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [
             {
                 "client_id": row[0],
                 "name": row[1],
                 "language": row[2],
-                "last_contact": row[4],
-                "lead_score": row[5],
+                "last_contact": row[3],
+                "lead_score": row[4],
             }
             for row in rows
         ]
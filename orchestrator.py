@@ -1,9 +1,89 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
 from .translator import TranslatorAgent
 from .quick_response import QuickResponseAgent
-from .sentiment import SentimentAgent
+from .sentiment import SentimentAgent, TRANSLATION_FIELDS
 from .lead_qualifier import LeadQualifierAgent
 from .memory import MemoryAgent
 
+# Messages get_inbox_overview processes at once, capped to stay under Groq
+# rate limits.
+INBOX_CONCURRENCY = 32
+
+# Tasks process_message submits per message: the context read plus the
+# sentiment, signals, lead and suggestion calls.
+TASKS_PER_MESSAGE = 5
+
+# Shared pool for overlapping independent, network-bound agent calls.
+# The Groq SDK client is synchronous, so threads give the same overlap as
+# an async client without changing any agent's API. It is sized so every
+# inbox message's fan-out can run at once; threads are only started as
+# tasks arrive, so single messages use just a few.
+_EXECUTOR = ThreadPoolExecutor(max_workers=INBOX_CONCURRENCY * TASKS_PER_MESSAGE, thread_name_prefix="agents")
+
+# Separate pool for whole-message work in get_inbox_overview. Its tasks
+# block on tasks they submit into _EXECUTOR, so sharing one pool could
+# deadlock.
+_INBOX_EXECUTOR = ThreadPoolExecutor(max_workers=INBOX_CONCURRENCY, thread_name_prefix="inbox")
+
+# Messages too trivial to be worth any model call. Checked in order; each
+# kind maps to a canned sentiment analysis and a reply template category.
+_TRIVIAL_RULES = [
+    ("greeting", re.compile(r"^\s*(hi+|hel+o+|he+y+)[\s!.]*$", re.I)),
+    ("thanks", re.compile(r"^\s*(thanks|thank you|ok|okay|👍|❤️?)[\s!.]*$", re.I)),
+    # Nothing but a shortened link, or one letter repeated ten or more times
+    ("spam", re.compile(r"^\s*((https?://)?(bit\.ly|tinyurl\.com)/\S*|(\w)\4{9,})\s*$", re.I)),
+]
+_TRIVIAL_ANALYSES = {
+    "spam": {
+        "sentiment": "neutral",
+        "priority": 1,
+        "category": "spam",
+        "requires_immediate_attention": False,
+        "summary": "Likely spam",
+    },
+    "greeting": {
+        "sentiment": "positive",
+        "priority": 3,
+        "category": "general_inquiry",
+        "requires_immediate_attention": False,
+        "summary": "Greeting",
+    },
+    "thanks": {
+        "sentiment": "positive",
+        "priority": 2,
+        "category": "follow_up",
+        "requires_immediate_attention": False,
+        "summary": "Acknowledgement",
+    },
+}
+
+# Recommended actions as (predicate(sentiment, lead, signals), action),
+# checked in order; the first match wins.
+_RECOMMENDED_ACTIONS = [
+    (lambda sentiment, lead, signals: sentiment.get("requires_immediate_attention"),
+     "URGENT: Respond immediately - customer needs attention"),
+    (lambda sentiment, lead, signals: signals.get("signal_strength") == "strong",
+     "HOT LEAD: Strong buying signal detected - prioritize closing"),
+    (lambda sentiment, lead, signals: lead.get("score") == "hot",
+     "Ready to buy - present offer and close"),
+    (lambda sentiment, lead, signals: sentiment.get("category") == "complaint",
+     "Address complaint promptly - risk of losing customer"),
+    (lambda sentiment, lead, signals: lead.get("score") == "warm",
+     "Nurture lead - provide value and build relationship"),
+    (lambda sentiment, lead, signals: sentiment.get("category") == "sales_opportunity",
+     "Sales opportunity - qualify further and present value"),
+]
+_DEFAULT_ACTION = "Respond helpfully - standard inquiry"
+
+
+def _trivial_kind(message: str) -> str:
+    """Return "spam", "greeting" or "thanks" for trivial messages, else None."""
+    for kind, pattern in _TRIVIAL_RULES:
+        if pattern.search(message):
+            return kind
+    return None
+
 
 class AgentOrchestrator:
     """Orchestrator that coordinates all 5 agents for message processing."""
@@ -15,46 +95,79 @@ class AgentOrchestrator:
         self.qualifier = LeadQualifierAgent()
         self.memory = MemoryAgent()
 
-    def process_message(self, message: str, client_id: str, save_to_memory: bool = True) -> dict:
+    def process_message(self, message: str, client_id: str, save_to_memory: bool = True, batch: bool = False) -> dict:
         """
         Process an incoming message through all agents.
 
-        Returns a comprehensive analysis with suggested responses.
+        Returns a comprehensive analysis with suggested responses. With
+        ``batch=True`` the lead score and buying signals go through the
+        qualifier's batching queues, so many concurrent calls share a few
+        model requests; get_inbox_overview uses this.
         """
-        # 1. Get client context from memory
-        context = self.memory.get_context(client_id)
+        # Greetings, thanks and spam get a canned analysis with no model calls
+        kind = _trivial_kind(message)
+        if kind is not None:
+            return self._trivial_analysis(message, client_id, kind, save_to_memory)
+
+        # 1. Get client context from memory while the message is translated
+        context_future = _EXECUTOR.submit(self.memory.get_context, client_id)
+
+        # 2. Detect language. A message already in the preferred language
+        # needs no translation, so its sentiment analysis runs alongside the
+        # other agents. Otherwise translation and analysis share one model
+        # call that the rest must wait for.
+        target_lang = self.translator.preferred_language
+        detected_language = self.translator.detect_language(message)
+        sentiment_future = None
+        if detected_language == target_lang:
+            translated_message = message
+            sentiment_future = _EXECUTOR.submit(self.sentiment.analyze, message)
+        else:
+            fused = self.sentiment.analyze_and_translate(
+                message, target_lang=target_lang, source_lang=detected_language
+            )
+            detected_language = fused["detected_language"]
+            translated_message = fused["translated"]
+            sentiment_analysis = {k: v for k, v in fused.items() if k not in TRANSLATION_FIELDS}
 
-        # 2. Detect language and translate if needed
-        translation = self.translator.translate(message)
-        detected_language = translation["source_language"]
-        translated_message = translation["translated"]
+        # The remaining agents only need the translation and context, so
+        # they all run concurrently and are joined when the result is built.
 
-        # 3. Analyze sentiment and priority
-        sentiment_analysis = self.sentiment.analyze(translated_message)
+        # 3. Detect buying signals
+        if batch:
+            signals_future = self.qualifier.submit_buying_signals(translated_message)
+        else:
+            signals_future = _EXECUTOR.submit(self.qualifier.detect_buying_signals, translated_message)
 
-        # 4. Get conversation history for lead qualification
-        history = context.get("recent_history", [])
+        # 4. Score the lead on the conversation history
+        context = context_future.result()
+        # Copy so the incoming message is not appended to the context's own
+        # list, which is returned to the caller as client_context
+        history = list(context.get("recent_history", ()))
         history.append({"role": "client", "content": translated_message})
+        if batch:
+            lead_future = self.qualifier.submit_score_lead(history)
+        else:
+            lead_future = _EXECUTOR.submit(self.qualifier.score_lead, history)
 
-        # 5. Score the lead
-        lead_score = self.qualifier.score_lead(history)
-
-        # 6. Generate response suggestions
+        # 5. Generate response suggestions
         context_summary = context.get("summary", "")
-        suggestions = self.responder.suggest_replies(
+        suggestions_future = _EXECUTOR.submit(
+            self.responder.suggest_replies,
             translated_message,
             context=context_summary,
             count=3
         )
 
-        # 7. Detect buying signals
-        buying_signals = self.qualifier.detect_buying_signals(translated_message)
+        if sentiment_future is not None:
+            sentiment_analysis = sentiment_future.result()
+        buying_signals = signals_future.result()
+        lead_score = lead_future.result()
+        suggestions = suggestions_future.result()
 
-        # 8. Save to memory if enabled
+        # 6. Save to memory if enabled
         if save_to_memory:
-            self.memory.save_message(client_id, "client", message)
-            self.memory.save_client(client_id, language=detected_language)
-            self.memory.update_lead_score(client_id, lead_score.get("score", "warm"))
+            self._save_turn(client_id, detected_language, lead_score, [(message, None)])
 
         # Compile result
         result = {
@@ -65,35 +178,75 @@ class AgentOrchestrator:
             "sentiment": sentiment_analysis,
             "lead_qualification": lead_score,
             "buying_signals": buying_signals,
+            "is_serious_buyer": self.qualifier.is_serious_buyer(lead_data=lead_score),
+            "closing_approach": self.qualifier.suggest_closing_approach(lead_score),
             "client_context": context,
             "suggested_responses": suggestions,
             "requires_immediate_attention": sentiment_analysis.get("requires_immediate_attention", False),
             "recommended_action": self._get_recommended_action(sentiment_analysis, lead_score, buying_signals),
+            "trivial": None,
         }
 
         return result
 
-    def _get_recommended_action(self, sentiment: dict, lead: dict, signals: dict) -> str:
-        """Determine the best recommended action based on all analyses."""
-        if sentiment.get("requires_immediate_attention"):
-            return "URGENT: Respond immediately - customer needs attention"
+    def _trivial_analysis(self, message: str, client_id: str, kind: str, save_to_memory: bool) -> dict:
+        """Build a process_message result for a trivial message without any agent calls."""
+        context = self.memory.get_context(client_id)
+        client = context.get("client") or {}
+        sentiment_analysis = dict(_TRIVIAL_ANALYSES[kind])
+        lead_score = {
+            "score": "cold" if kind == "spam" else client.get("lead_score") or "warm",
+            "confidence": 0,
+            "intent_level": 1 if kind == "spam" else 5,
+            "reasoning": "Trivial message, not scored",
+        }
+        buying_signals = {"has_buying_signal": False, "signal_strength": "weak", "signals_detected": []}
 
-        if signals.get("signal_strength") == "strong":
-            return "HOT LEAD: Strong buying signal detected - prioritize closing"
+        if save_to_memory:
+            # Only the message is stored; the stored language and lead
+            # score are left as they were.
+            self.memory.save_messages_bulk(client_id, [(message, None)])
 
-        if lead.get("score") == "hot":
-            return "Ready to buy - present offer and close"
+        return {
+            "client_id": client_id,
+            "original_message": message,
+            "translated_message": message,
+            "detected_language": client.get("language") or self.translator.preferred_language,
+            "sentiment": sentiment_analysis,
+            "lead_qualification": lead_score,
+            "buying_signals": buying_signals,
+            "is_serious_buyer": False,
+            "closing_approach": self.qualifier.suggest_closing_approach(lead_score),
+            "client_context": context,
+            "suggested_responses": self.responder.get_template(kind),
+            "requires_immediate_attention": False,
+            "recommended_action": self._get_recommended_action(sentiment_analysis, lead_score, buying_signals),
+            "trivial": kind,
+        }
 
-        if sentiment.get("category") == "complaint":
-            return "Address complaint promptly - risk of losing customer"
+    def _save_turn(self, client_id: str, language: str, lead_score: dict, pairs: list):
+        """Store the client's language, lead score and (message, reply) pairs."""
+        self.memory.save_client(client_id, language=language)
+        self.memory.update_lead_score(client_id, lead_score.get("score", "warm"))
+        self.memory.save_messages_bulk(client_id, pairs)
 
-        if lead.get("score") == "warm":
-            return "Nurture lead - provide value and build relationship"
+    def _save_reply_turn(self, client_id: str, analysis: dict, pairs: list):
+        """Save an auto-reply turn, leaving the profile alone for trivial messages.
 
-        if sentiment.get("category") == "sales_opportunity":
-            return "Sales opportunity - qualify further and present value"
+        Trivial messages were never scored, so their canned lead score and
+        language must not overwrite what is stored for the client.
+        """
+        if analysis.get("trivial"):
+            self.memory.save_messages_bulk(client_id, pairs)
+        else:
+            self._save_turn(client_id, analysis["detected_language"], analysis["lead_qualification"], pairs)
 
-        return "Respond helpfully - standard inquiry"
+    def _get_recommended_action(self, sentiment: dict, lead: dict, signals: dict) -> str:
+        """Determine the best recommended action based on all analyses."""
+        for matches, action in _RECOMMENDED_ACTIONS:
+            if matches(sentiment, lead, signals):
+                return action
+        return _DEFAULT_ACTION
 
     def prepare_response(self, response: str, client_id: str, tone: str = "professional") -> dict:
         """
@@ -103,13 +256,16 @@ class AgentOrchestrator:
         """
         # Get client's language
         context = self.memory.get_context(client_id)
-        client_language = context.get("client", {}).get("language", "en")
+        client_language = (context.get("client") or {}).get("language") or "en"
 
         # Adjust tone
         adjusted = self.translator.adjust_tone(response, tone=tone)
 
-        # Translate to client's language
-        translated = self.translator.translate_for_client(adjusted, client_language)
+        # Translate to client's language; English clients need no translation
+        if client_language == "en":
+            translated = adjusted
+        else:
+            translated = self.translator.translate_for_client(adjusted, client_language)
 
         # Save to memory
         self.memory.save_message(client_id, "assistant", response)
@@ -128,16 +284,18 @@ class AgentOrchestrator:
 
         messages: list of {"id": str, "client_id": str, "content": str}
         """
-        analyzed = []
-
-        for msg in messages:
+        def analyze(msg):
             analysis = self.process_message(
                 msg["content"],
                 msg["client_id"],
-                save_to_memory=False
+                save_to_memory=False,
+                batch=True,
             )
             analysis["message_id"] = msg.get("id")
-            analyzed.append(analysis)
+            return analysis
+
+        # Messages are independent, so analyze them concurrently
+        analyzed = list(_INBOX_EXECUTOR.map(analyze, messages))
 
         # Sort by priority and urgency
         analyzed.sort(
@@ -149,12 +307,21 @@ class AgentOrchestrator:
             reverse=True
         )
 
-        # Generate summary
+        # Generate summary in one pass over the results
+        urgent = hot_leads = complaints = 0
+        for m in analyzed:
+            if m.get("requires_immediate_attention"):
+                urgent += 1
+            if (m.get("lead_qualification") or {}).get("score") == "hot":
+                hot_leads += 1
+            if (m.get("sentiment") or {}).get("category") == "complaint":
+                complaints += 1
+
         summary = {
             "total_messages": len(analyzed),
-            "urgent": len([m for m in analyzed if m.get("requires_immediate_attention")]),
-            "hot_leads": len([m for m in analyzed if m.get("lead_qualification", {}).get("score") == "hot"]),
-            "complaints": len([m for m in analyzed if m.get("sentiment", {}).get("category") == "complaint"]),
+            "urgent": urgent,
+            "hot_leads": hot_leads,
+            "complaints": complaints,
             "prioritized_inbox": analyzed,
         }
 
@@ -162,14 +329,14 @@ class AgentOrchestrator:
 
     def quick_analyze(self, message: str) -> dict:
         """Quick analysis without full processing - for speed."""
-        sentiment = self.sentiment.get_sentiment(message)
-        priority = self.sentiment.get_priority(message)
-        category = self.sentiment.categorize(message)
+        analysis = self.sentiment.analyze(message)
+        sentiment = analysis.get("sentiment", "neutral")
+        priority = analysis.get("priority", 5)
 
         return {
             "sentiment": sentiment,
             "priority": priority,
-            "category": category,
+            "category": analysis.get("category", "general_inquiry"),
             "needs_attention": priority >= 8 or sentiment in ["angry", "frustrated"],
         }
 
@@ -185,26 +352,27 @@ class AgentOrchestrator:
         missing = self.qualifier.get_missing_qualification_info(conversation)
         return self.qualifier.get_qualification_questions(missing_info=missing)
 
-    def auto_reply(self, message: str, client_id: str, tone: str = "friendly", business_info: dict = None) -> dict:
+    def auto_reply(self, message: str, client_id: str, tone: str = "friendly", business_info: dict = None, analysis: dict = None) -> dict:
         """
         Automatically generate the best reply for a message.
 
         Returns a ready-to-send response in the client's language.
+
+        Pass the process_message result for this message as ``analysis`` to
+        skip analyzing it again. It must come from process_message with
+        save_to_memory=False, since auto_reply saves the turn itself.
         """
-        # Process the message through all agents
-        analysis = self.process_message(message, client_id)
+        # Process the message through all agents; the turn is saved below
+        # together with the reply
+        if analysis is None:
+            analysis = self.process_message(message, client_id, save_to_memory=False)
 
         # Build context for generating the best response
         client_lang = analysis["detected_language"]
         sentiment = analysis["sentiment"]
         lead_score = analysis["lead_qualification"]
         context = analysis["client_context"]
-
-        # Determine the best tone based on sentiment
-        if sentiment.get("sentiment") in ["angry", "frustrated"]:
-            tone = "professional"  # Be calm and professional with upset customers
-        elif lead_score.get("score") == "hot":
-            tone = "persuasive"  # Be persuasive with hot leads
+        tone = self._pick_tone(sentiment, lead_score, tone)
 
         # Generate the best response using AI
         best_response = self.responder.generate_best_reply(
@@ -212,20 +380,19 @@ class AgentOrchestrator:
             sentiment=sentiment,
             lead_score=lead_score,
             context_summary=context.get("summary", ""),
-            business_info=business_info or {}
+            business_info=business_info or {},
+            tone=tone,
         )
 
-        # Translate back to client's language if needed
+        # Translate back to client's language if needed. The reply is
+        # written in English, so there is nothing to detect.
         if client_lang != "en":
-            final_response = self.translator.translate_for_client(best_response, client_lang)
+            final_response = self.translator.translate_for_client(best_response, client_lang, source_language="en")
         else:
             final_response = best_response
 
-        # Adjust tone
-        final_response = self.translator.adjust_tone(final_response, tone=tone)
-
-        # Save to memory
-        self.memory.save_message(client_id, "assistant", final_response)
+        # Save the client message and reply in one write
+        self._save_reply_turn(client_id, analysis, [(message, final_response)])
 
         return {
             "client_id": client_id,
@@ -237,3 +404,48 @@ class AgentOrchestrator:
             "auto_reply": final_response,
             "analysis": analysis,
         }
+
+    def _pick_tone(self, sentiment: dict, lead_score: dict, tone: str) -> str:
+        """Determine the best tone based on sentiment."""
+        if sentiment.get("sentiment") in ["angry", "frustrated"]:
+            return "professional"  # Be calm and professional with upset customers
+        if lead_score.get("score") == "hot":
+            return "persuasive"  # Be persuasive with hot leads
+        return tone
+
+    def stream_auto_reply(self, message: str, client_id: str, tone: str = "friendly", business_info: dict = None, analysis: dict = None):
+        """
+        Like auto_reply, but yield the reply text as it is generated.
+
+        English replies stream straight from the model with the tone written
+        into the prompt. Replies for other languages are yielded once, after
+        translation. The turn is saved when the reply is complete. As with
+        auto_reply, an existing ``analysis`` skips process_message.
+        """
+        if analysis is None:
+            analysis = self.process_message(message, client_id, save_to_memory=False)
+
+        sentiment = analysis["sentiment"]
+        lead_score = analysis["lead_qualification"]
+        client_lang = analysis["detected_language"]
+        chunks = self.responder.stream_best_reply(
+            message=analysis["translated_message"],
+            sentiment=sentiment,
+            lead_score=lead_score,
+            context_summary=analysis["client_context"].get("summary", ""),
+            business_info=business_info or {},
+            tone=self._pick_tone(sentiment, lead_score, tone),
+        )
+
+        if client_lang != "en":
+            draft = "".join(chunks)
+            final_response = self.translator.translate_for_client(draft, client_lang, source_language="en")
+            yield final_response
+        else:
+            parts = []
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+            final_response = "".join(parts)
+
+        self._save_reply_turn(client_id, analysis, [(message, final_response)])
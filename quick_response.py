@@ -1,15 +1,66 @@
-from groq import Groq
 import json
-from config import GROQ_API_KEY
+import re
+from collections import deque
+from ._client import CLIENT
+from .llm_cache import _json_loads, chat, json_object_with
 from business_config import PRICING, FAQ, BUSINESS_INFO, get_full_context
 
+# Keyword rules tried in order before asking the model to categorize.
+# More specific intents come first so "hi, how much?" is pricing.
+_CATEGORY_RULES = [
+    (re.compile(r"\b(price|cost|pricing|how much)\b", re.I), "pricing"),
+    (re.compile(r"\b(ship|shipping|deliver|delivery)\b", re.I), "shipping"),
+    (re.compile(r"\b(available|in stock|stock)\b", re.I), "availability"),
+    (re.compile(r"\b(hours|open|close|closed)\b", re.I), "hours"),
+    (re.compile(r"\bthank", re.I), "thanks"),
+    (re.compile(r"\b(hi|hello|hey|good (morning|evening))\b", re.I), "greeting"),
+]
+
+# Chosen replies kept for learning the user's style; the prompt uses the
+# last LEARNED_EXAMPLES of them.
+LEARNED_RESPONSES_SIZE = 100
+LEARNED_EXAMPLES = 10
+
+# Situational reply instructions, looked up by sentiment first, then lead
+# score, then category; the first match wins.
+_UPSET_INSTRUCTION = "The customer is upset. Be apologetic, empathetic, and solution-focused. Acknowledge their frustration."
+_SENTIMENT_INSTRUCTIONS = {
+    "angry": _UPSET_INSTRUCTION,
+    "frustrated": _UPSET_INSTRUCTION,
+    "positive": "The customer is happy. Be warm and enthusiastic. Build on their positive energy.",
+}
+_LEAD_INSTRUCTIONS = {
+    "hot": "This is a hot lead ready to buy. Be helpful and guide them toward purchase without being pushy.",
+}
+_CATEGORY_INSTRUCTIONS = {
+    "sales_opportunity": "This is a sales opportunity. Be helpful, highlight value, and gently guide toward a decision.",
+}
+_DEFAULT_INSTRUCTION = "Be friendly, helpful, and professional."
+
+# Writing styles generate_best_reply can be asked for, so the reply comes
+# out in the right tone without a separate rewrite.
+_TONE_INSTRUCTIONS = {
+    "friendly": "Write it warm, casual, and approachable, in a conversational style.",
+    "professional": "Write it formal, polite, and business-appropriate.",
+    "persuasive": "Write it compelling and sales-oriented while remaining respectful.",
+}
+
 
 class QuickResponseAgent:
     """Quick Response Agent - Generates contextual reply suggestions."""
 
     def __init__(self):
-        self.client = Groq(api_key=GROQ_API_KEY)
+        self.client = CLIENT
         self.model = "llama-3.3-70b-versatile"
+        # Identical on every generate_best_reply call, so the provider can
+        # reuse the cached prefix; per-message instructions go in the user turn.
+        self._static_system = f"""You are a helpful Instagram business assistant for {BUSINESS_INFO.get("name", "amilie")}.
+You help respond to customer DMs professionally and naturally.
+Keep responses short (1-3 sentences), friendly, and actionable.
+
+{get_full_context()}
+
+IMPORTANT: When asked about pricing, delivery, revisions, or payment - use the EXACT information above."""
         self.templates = {
             "pricing": [
                 "Thanks for your interest! Our pricing starts at {price}. Would you like more details?",
@@ -42,13 +93,17 @@ class QuickResponseAgent:
                 "My pleasure! Is there anything else I can help with?",
             ],
         }
-        self.learned_responses = []
+        self.learned_responses = deque(maxlen=LEARNED_RESPONSES_SIZE)
+        self._examples_text_cache = None  # Rendered examples, reset by learn_response
 
     def suggest_replies(self, message: str, context: str = "", count: int = 3) -> list:
         """Generate contextual reply suggestions based on message content."""
-        response = self.client.chat.completions.create(
+        content = chat(
+            self.client,
             model=self.model,
-            max_tokens=1024,
+            max_tokens=256,
+            response_format={"type": "json_object"},
+            validate=json_object_with("replies"),
             messages=[
                 {
                     "role": "user",
@@ -59,17 +114,17 @@ Each reply should be 1-2 sentences max.
 Customer message: {message}
 {"Context: " + context if context else ""}
 
-Output as JSON array of strings only, no other text.
-Example: ["Reply 1", "Reply 2", "Reply 3"]""",
+Output a JSON object with a "replies" array of strings, no other text.
+Example: {{"replies": ["Reply 1", "Reply 2", "Reply 3"]}}""",
                 }
             ],
         )
 
         try:
-            suggestions = json.loads(response.choices[0].message.content)
+            suggestions = _json_loads(content)["replies"]
             return suggestions[:count]
-        except:
-            return [response.choices[0].message.content]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return [content]
 
     def get_template(self, category: str) -> list:
         """Get pre-built templates for common inquiries."""
@@ -77,9 +132,15 @@ Example: ["Reply 1", "Reply 2", "Reply 3"]""",
 
     def categorize_inquiry(self, message: str) -> str:
         """Determine what type of inquiry this is."""
-        response = self.client.chat.completions.create(
+        for pattern, category in _CATEGORY_RULES:
+            if pattern.search(message):
+                return category
+
+        content = chat(
+            self.client,
             model=self.model,
-            max_tokens=50,
+            max_tokens=10,
+            stop=["\n"],
             messages=[
                 {
                     "role": "user",
@@ -93,7 +154,7 @@ Output only the category name, nothing else.""",
             ],
         )
 
-        return response.choices[0].message.content.strip().lower()
+        return content.strip().lower()
 
     def auto_suggest(self, message: str, context: str = "") -> dict:
         """Automatically categorize and suggest responses."""
@@ -113,20 +174,27 @@ Output only the category name, nothing else.""",
             "inquiry": message,
             "response": chosen_response,
         })
+        self._examples_text_cache = None
 
     def get_personalized_suggestion(self, message: str) -> str:
         """Generate suggestion based on learned communication style."""
         if not self.learned_responses:
             return self.suggest_replies(message, count=1)[0]
 
-        examples = self.learned_responses[-10:]  # Last 10 responses
-        examples_text = "\n".join(
-            [f"Q: {ex['inquiry']}\nA: {ex['response']}" for ex in examples]
-        )
-
-        response = self.client.chat.completions.create(
+        examples_text = self._examples_text_cache
+        if examples_text is None:
+            examples = list(self.learned_responses)[-LEARNED_EXAMPLES:]
+            examples_text = "\n".join(
+                [f"Q: {ex['inquiry']}\nA: {ex['response']}" for ex in examples]
+            )
+            self._examples_text_cache = examples_text
+
+        content = chat(
+            self.client,
+            cache=False,
             model=self.model,
             max_tokens=256,
+            stop=["\nQ:"],
             messages=[
                 {
                     "role": "user",
@@ -142,49 +210,35 @@ Output only the suggested reply.""",
             ],
         )
 
-        return response.choices[0].message.content
-
-    def generate_best_reply(self, message: str, sentiment: dict, lead_score: dict, context_summary: str = "", business_info: dict = None) -> str:
-        """Generate the single best reply based on all context."""
-        business_name = BUSINESS_INFO.get("name", "amilie")
-        business_context = get_full_context()
+        return content
 
+    def _best_reply_request(self, message: str, sentiment: dict, lead_score: dict, context_summary: str = "", tone: str = None) -> dict:
+        """Build the chat request shared by generate_best_reply and stream_best_reply."""
         sentiment_type = sentiment.get("sentiment", "neutral")
         category = sentiment.get("category", "general_inquiry")
         lead_type = lead_score.get("score", "warm")
 
         # Build instruction based on context
-        tone_instruction = ""
-        if sentiment_type in ["angry", "frustrated"]:
-            tone_instruction = "The customer is upset. Be apologetic, empathetic, and solution-focused. Acknowledge their frustration."
-        elif sentiment_type == "positive":
-            tone_instruction = "The customer is happy. Be warm and enthusiastic. Build on their positive energy."
-        elif lead_type == "hot":
-            tone_instruction = "This is a hot lead ready to buy. Be helpful and guide them toward purchase without being pushy."
-        elif category == "sales_opportunity":
-            tone_instruction = "This is a sales opportunity. Be helpful, highlight value, and gently guide toward a decision."
-        else:
-            tone_instruction = "Be friendly, helpful, and professional."
-
-        response = self.client.chat.completions.create(
+        tone_instruction = (
+            _SENTIMENT_INSTRUCTIONS.get(sentiment_type)
+            or _LEAD_INSTRUCTIONS.get(lead_type)
+            or _CATEGORY_INSTRUCTIONS.get(category)
+            or _DEFAULT_INSTRUCTION
+        )
+        if tone in _TONE_INSTRUCTIONS:
+            tone_instruction += " " + _TONE_INSTRUCTIONS[tone]
+
+        return dict(
             model=self.model,
             max_tokens=300,
+            stop=["\n\nCustomer:"],
             messages=[
-                {
-                    "role": "system",
-                    "content": f"""You are a helpful Instagram business assistant for {business_name}.
-You help respond to customer DMs professionally and naturally.
-Keep responses short (1-3 sentences), friendly, and actionable.
-
-{business_context}
-
-{tone_instruction}
-
-IMPORTANT: When asked about pricing, delivery, revisions, or payment - use the EXACT information above."""
-                },
+                {"role": "system", "content": self._static_system},
                 {
                     "role": "user",
-                    "content": f"""Generate the best reply for this Instagram DM.
+                    "content": f"""{tone_instruction}
+
+Generate the best reply for this Instagram DM.
 
 Customer message: {message}
 Customer sentiment: {sentiment_type}
@@ -197,4 +251,24 @@ IMPORTANT: Reply in ENGLISH. Write a natural, helpful response. Only output the
             ],
         )
 
-        return response.choices[0].message.content
+    def generate_best_reply(self, message: str, sentiment: dict, lead_score: dict, context_summary: str = "", business_info: dict = None, tone: str = None) -> str:
+        """Generate the single best reply based on all context.
+
+        tone (friendly, professional or persuasive) is written into the
+        prompt, so the reply needs no separate adjust_tone pass.
+        """
+        return chat(
+            self.client,
+            cache=False,
+            **self._best_reply_request(message, sentiment, lead_score, context_summary, tone),
+        )
+
+    def stream_best_reply(self, message: str, sentiment: dict, lead_score: dict, context_summary: str = "", business_info: dict = None, tone: str = None):
+        """Generate the best reply like generate_best_reply, yielding text as it arrives."""
+        stream = self.client.chat.completions.create(
+            stream=True,
+            **self._best_reply_request(message, sentiment, lead_score, context_summary, tone),
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,86 @@
+import re
+import threading
+from collections import OrderedDict
+
+# Try to import sentence-transformers for embedding-based lookup
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+class SemanticCache:
+    """In-process cache that returns stored results for similar inputs.
+
+    With sentence-transformers installed, lookups compare normalized
+    sentence embeddings and hit when cosine similarity >= ``threshold``.
+    Without it, lookups fall back to exact matching on normalized text.
+    """
+
+    def __init__(self, threshold: float = 0.90, max_entries: int = 1024,
+                 model_name: str = "all-MiniLM-L6-v2"):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self._model = None
+        self._entries = OrderedDict()  # normalized text -> (embedding, value)
+        self._missed = OrderedDict()  # normalized text -> embedding from a missed get()
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str):
+        with self._lock:
+            if self._model is None:
+                self._model = SentenceTransformer(self.model_name)
+            model = self._model
+        return model.encode(text, normalize_embeddings=True)
+
+    def get(self, text: str):
+        """Return the cached value for ``text`` or a similar input, else None."""
+        key = normalize_text(text)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            if not EMBEDDINGS_AVAILABLE or not self._entries:
+                return None
+            keys = list(self._entries)
+            matrix = np.stack([self._entries[k][0] for k in keys])
+
+        embedding = self._embed(key)
+        scores = matrix @ embedding
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            # Keep the embedding so the set() that usually follows a miss reuses it
+            with self._lock:
+                self._missed[key] = embedding
+                while len(self._missed) > self.max_entries:
+                    self._missed.popitem(last=False)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(keys[best])
+            return entry[1] if entry else None
+
+    def set(self, text: str, value):
+        """Store ``value`` for ``text``, evicting the oldest entry when full."""
+        key = normalize_text(text)
+        with self._lock:
+            embedding = self._missed.pop(key, None)
+        if embedding is None and EMBEDDINGS_AVAILABLE:
+            embedding = self._embed(key)
+        with self._lock:
+            self._entries[key] = (embedding, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,41 +1,81 @@
-from groq import Groq
 import json
-from config import GROQ_API_KEY
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ._client import CLIENT
+from .llm_cache import _json_loads, chat, format_batch_rows, json_object_with, match_batch_rows
+from .translator import LANGUAGE_NAMES, TranslatorAgent, detect_language, translation_budget
+
+# Analyses kept so the single-field helpers reuse one model call.
+ANALYSIS_CACHE_SIZE = 256
+
+# Messages sent per prompt by batch_analyze_llm, and prompts in flight.
+BATCH_CHUNK_SIZE = 16
+BATCH_CONCURRENCY = 4
+
+# Shared by every batch_analyze_llm call instead of a pool per call.
+_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="sentiment-batch")
+
+# Fixed instructions for analyze(), sent as the system prompt so every
+# call shares the same prefix and only the message varies.
+_ANALYSIS_PROMPT = """Analyze the Instagram DM you are given and provide:
+1. sentiment: one of [positive, neutral, negative, angry, frustrated]
+2. priority: score from 1-10 (10 = most urgent)
+3. category: one of [urgent, sales_opportunity, general_inquiry, spam, complaint, follow_up]
+4. requires_immediate_attention: true/false
+5. summary: one sentence summary of the message intent
+
+Output as JSON only, no other text."""
+
+# Fields a reply must carry before it is memoized as an analysis.
+ANALYSIS_FIELDS = ("sentiment", "priority", "category")
+
+# Keys analyze_and_translate adds on top of the analyze() fields.
+TRANSLATION_FIELDS = ("detected_language", "translated", "was_translated")
+
+
+def _is_analysis(result) -> bool:
+    return isinstance(result, dict) and all(field in result for field in ANALYSIS_FIELDS)
 
 
 class SentimentAgent:
     """Sentiment & Priority Agent - Analyzes messages for urgency and tone."""
 
     def __init__(self):
-        self.client = Groq(api_key=GROQ_API_KEY)
+        self.client = CLIENT
         self.model = "llama-3.3-70b-versatile"
+        self._analysis_cache = OrderedDict()
+        self._analysis_lock = threading.Lock()
+        self.translator = TranslatorAgent()
 
     def analyze(self, message: str) -> dict:
-        """Full sentiment and priority analysis of a message."""
-        response = self.client.chat.completions.create(
+        """Full sentiment and priority analysis of a message.
+
+        Results are memoized per message, so get_sentiment, get_priority,
+        categorize and is_urgent on the same message share one model call.
+        """
+        with self._analysis_lock:
+            if message in self._analysis_cache:
+                self._analysis_cache.move_to_end(message)
+                return dict(self._analysis_cache[message])
+
+        content = chat(
+            self.client,
             model=self.model,
             max_tokens=256,
+            response_format={"type": "json_object"},
+            validate=json_object_with(*ANALYSIS_FIELDS),
             messages=[
-                {
-                    "role": "user",
-                    "content": f"""Analyze this Instagram DM and provide:
-1. sentiment: one of [positive, neutral, negative, angry, frustrated]
-2. priority: score from 1-10 (10 = most urgent)
-3. category: one of [urgent, sales_opportunity, general_inquiry, spam, complaint, follow_up]
-4. requires_immediate_attention: true/false
-5. summary: one sentence summary of the message intent
-
-Message: {message}
-
-Output as JSON only, no other text.""",
-                }
+                {"role": "system", "content": _ANALYSIS_PROMPT},
+                {"role": "user", "content": f"Message: {message}"},
             ],
         )
 
         try:
-            result = json.loads(response.choices[0].message.content)
-            return result
-        except:
+            result = _json_loads(content)
+        except (json.JSONDecodeError, TypeError):
+            result = None
+        if not _is_analysis(result):
             return {
                 "sentiment": "neutral",
                 "priority": 5,
@@ -44,35 +84,57 @@ Output as JSON only, no other text.""",
                 "summary": message[:100],
             }
 
-    def get_sentiment(self, message: str) -> str:
-        """Quick sentiment detection only."""
-        response = self.client.chat.completions.create(
-            model=self.model,
-            max_tokens=20,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""What is the emotional tone of this message?
-Reply with ONE word: positive, neutral, negative, angry, or frustrated
+        self._remember_analysis(message, result)
+        return dict(result)
 
-Message: {message}""",
-                }
-            ],
-        )
+    def _remember_analysis(self, message: str, result: dict):
+        if not _is_analysis(result):
+            return
+        with self._analysis_lock:
+            self._analysis_cache[message] = result
+            self._analysis_cache.move_to_end(message)
+            while len(self._analysis_cache) > ANALYSIS_CACHE_SIZE:
+                self._analysis_cache.popitem(last=False)
 
-        return response.choices[0].message.content.strip().lower()
+    def analyze_and_translate(self, message: str, target_lang: str = "en", source_lang: str = None) -> dict:
+        """Translate a message and analyze it in a single model call.
 
-    def get_priority(self, message: str) -> int:
-        """Quick priority scoring only."""
-        response = self.client.chat.completions.create(
+        Returns the analyze() fields plus detected_language, translated and
+        was_translated. When the message is already in target_lang the
+        translation is skipped and only analyze() runs. If the combined reply
+        cannot be parsed, the message is translated and analyzed with
+        separate calls. Pass source_lang if the language has already been
+        detected.
+        """
+        if source_lang is None:
+            source_lang = detect_language(message)
+
+        if source_lang == target_lang:
+            result = self.analyze(message)
+            result.update(detected_language=source_lang, translated=message, was_translated=False)
+            return result
+
+        target_name = LANGUAGE_NAMES.get(target_lang, target_lang)
+
+        content = chat(
+            self.client,
             model=self.model,
-            max_tokens=10,
+            # Room for the translation plus the analysis fields
+            max_tokens=translation_budget(message, extra=192),
+            response_format={"type": "json_object"},
+            validate=json_object_with("translated"),
             messages=[
                 {
                     "role": "user",
-                    "content": f"""Rate the urgency of this message from 1-10.
-1 = not urgent, 10 = extremely urgent
-Reply with only a number.
+                    "content": f"""Translate this Instagram DM to {target_name} and analyze it.
+Return a JSON object with:
+1. detected_language: ISO 639-1 code of the message's language
+2. translated: the message translated to {target_name}, natural and conversational
+3. sentiment: one of [positive, neutral, negative, angry, frustrated]
+4. priority: score from 1-10 (10 = most urgent)
+5. category: one of [urgent, sales_opportunity, general_inquiry, spam, complaint, follow_up]
+6. requires_immediate_attention: true/false
+7. summary: one sentence summary of the message intent
 
 Message: {message}""",
                 }
@@ -80,29 +142,41 @@ Message: {message}""",
         )
 
         try:
-            return int(response.choices[0].message.content.strip())
-        except:
-            return 5
+            result = _json_loads(content)
+            translated = str(result.pop("translated"))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            translation = self.translator.translate(message, target_lang, source_language=source_lang)
+            result = self.analyze(message)
+            result.update(
+                detected_language=source_lang,
+                translated=translation["translated"],
+                was_translated=translation["was_translated"],
+            )
+            return result
 
-    def categorize(self, message: str) -> str:
-        """Categorize message type."""
-        response = self.client.chat.completions.create(
-            model=self.model,
-            max_tokens=30,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""Categorize this message as ONE of:
-urgent, sales_opportunity, general_inquiry, spam, complaint, follow_up
+        detected = result.pop("detected_language", None)
+        if source_lang == "unknown" and detected:
+            source_lang = str(detected).strip().lower()
+        self._remember_analysis(message, result)
 
-Message: {message}
+        result = dict(result)
+        result.update(detected_language=source_lang, translated=translated, was_translated=True)
+        return result
 
-Reply with only the category.""",
-                }
-            ],
-        )
+    def get_sentiment(self, message: str) -> str:
+        """Quick sentiment detection only."""
+        return str(self.analyze(message).get("sentiment", "neutral")).strip().lower()
+
+    def get_priority(self, message: str) -> int:
+        """Quick priority scoring only."""
+        try:
+            return int(self.analyze(message).get("priority", 5))
+        except (TypeError, ValueError):
+            return 5
 
-        return response.choices[0].message.content.strip().lower()
+    def categorize(self, message: str) -> str:
+        """Categorize message type."""
+        return str(self.analyze(message).get("category", "general_inquiry")).strip().lower()
 
     def is_urgent(self, message: str) -> bool:
         """Quick check if message requires immediate attention."""
@@ -114,11 +188,75 @@ Reply with only the category.""",
             or analysis.get("category") == "urgent"
         )
 
+    def _analyze_chunk(self, chunk: list) -> list:
+        """Analyze up to BATCH_CHUNK_SIZE messages with one model call."""
+        content = chat(
+            self.client,
+            model=self.model,
+            max_tokens=128 * len(chunk),
+            response_format={"type": "json_object"},
+            validate=json_object_with("results"),
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""Analyze these {len(chunk)} Instagram DMs, one per row. For each one provide:
+1. sentiment: one of [positive, neutral, negative, angry, frustrated]
+2. priority: score from 1-10 (10 = most urgent)
+3. category: one of [urgent, sales_opportunity, general_inquiry, spam, complaint, follow_up]
+4. requires_immediate_attention: true/false
+5. summary: one sentence summary of the message intent
+
+""" + format_batch_rows(chunk),
+                }
+            ],
+        )
+
+        try:
+            parsed = _json_loads(content)["results"]
+            by_row = match_batch_rows(parsed, len(chunk))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            by_row = {}
+
+        results = []
+        for i, msg in enumerate(chunk, 1):
+            item = by_row.get(i)
+            if not _is_analysis(item):
+                # Rows the batch reply missed or garbled go through analyze()
+                results.append(self.analyze(msg))
+                continue
+            item.pop("row", None)
+            self._remember_analysis(msg, item)
+            results.append(dict(item))
+        return results
+
+    def batch_analyze_llm(self, messages: list, chunk: int = BATCH_CHUNK_SIZE) -> list:
+        """Analyze many message texts, up to ``chunk`` per model call.
+
+        Returns one analyze() dict per message, in input order. Messages that
+        were analyzed before are answered from the cache, and chunks are sent
+        concurrently.
+        """
+        results = [None] * len(messages)
+        pending = []
+        with self._analysis_lock:
+            for i, msg in enumerate(messages):
+                if msg in self._analysis_cache:
+                    results[i] = dict(self._analysis_cache[msg])
+                else:
+                    pending.append(i)
+
+        chunks = [pending[start:start + chunk] for start in range(0, len(pending), chunk)]
+        analyzed = _BATCH_EXECUTOR.map(lambda idx: self._analyze_chunk([messages[i] for i in idx]), chunks)
+        for idx, chunk_results in zip(chunks, analyzed):
+            for i, result in zip(idx, chunk_results):
+                results[i] = result
+        return results
+
     def batch_analyze(self, messages: list) -> list:
         """Analyze multiple messages and sort by priority."""
+        analyses = self.batch_analyze_llm([msg["content"] for msg in messages])
         results = []
-        for msg in messages:
-            analysis = self.analyze(msg["content"])
+        for msg, analysis in zip(messages, analyses):
             analysis["message_id"] = msg.get("id")
             analysis["client_id"] = msg.get("client_id")
             analysis["content"] = msg["content"]
@@ -132,20 +270,25 @@ Reply with only the category.""",
         """Get summary statistics for inbox."""
         analyzed = self.batch_analyze(messages)
 
+        # Count categories and sentiments in one pass
+        categories = Counter()
+        sentiment_breakdown = {}
+        needs_attention = 0
+        for msg in analyzed:
+            categories[msg.get("category")] += 1
+            sentiment = msg.get("sentiment", "neutral")
+            sentiment_breakdown[sentiment] = sentiment_breakdown.get(sentiment, 0) + 1
+            if msg.get("requires_immediate_attention"):
+                needs_attention += 1
+
         summary = {
             "total": len(analyzed),
-            "urgent": len([m for m in analyzed if m.get("category") == "urgent"]),
-            "sales_opportunities": len([m for m in analyzed if m.get("category") == "sales_opportunity"]),
-            "complaints": len([m for m in analyzed if m.get("category") == "complaint"]),
-            "needs_attention": len([m for m in analyzed if m.get("requires_immediate_attention")]),
-            "sentiment_breakdown": {},
+            "urgent": categories["urgent"],
+            "sales_opportunities": categories["sales_opportunity"],
+            "complaints": categories["complaint"],
+            "needs_attention": needs_attention,
+            "sentiment_breakdown": sentiment_breakdown,
             "top_priority": analyzed[:5] if analyzed else [],
         }
 
-        for msg in analyzed:
-            sentiment = msg.get("sentiment", "neutral")
-            summary["sentiment_breakdown"][sentiment] = (
-                summary["sentiment_breakdown"].get(sentiment, 0) + 1
-            )
-
         return summary
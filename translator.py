@@ -1,43 +1,96 @@
-from groq import Groq
+import functools
 from langdetect import detect
-from config import GROQ_API_KEY, PREFERRED_LANGUAGE
+from langdetect.lang_detect_exception import LangDetectException
+from config import PREFERRED_LANGUAGE
+from ._client import CLIENT
+from .llm_cache import chat
+
+# Try to import fastText language ID (C++ backend, much faster than langdetect)
+try:
+    from ftlangdetect import detect as ftdetect
+    FASTTEXT_AVAILABLE = True
+except ImportError:
+    FASTTEXT_AVAILABLE = False
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "ar": "Arabic",
+    "zh": "Chinese",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "hi": "Hindi",
+    "ru": "Russian",
+}
+
+# Padded with spaces so only whole words match.
+_ENGLISH_MARKERS = (" the ", " and ", " is ", " you ", " for ")
+
+
+def _fast_detect(text: str) -> str:
+    """Return "en" for plain-ASCII text with common English words, else None."""
+    if text.isascii():
+        padded = f" {text.lower()} "
+        if any(marker in padded for marker in _ENGLISH_MARKERS):
+            return "en"
+    return None
+
+
+def translation_budget(text: str, extra: int = 64) -> int:
+    """max_tokens for output about as long as ``text``, capped at 1024.
+
+    Roughly two characters per token covers both Latin and CJK scripts.
+    """
+    return min(1024, len(text) // 2 + extra)
+
+
+@functools.lru_cache(maxsize=4096)
+def detect_language(text: str) -> str:
+    """Detect the language of text, or "unknown" if it cannot be detected."""
+    fast = _fast_detect(text)
+    if fast:
+        return fast
+    global FASTTEXT_AVAILABLE
+    if FASTTEXT_AVAILABLE:
+        try:
+            # fastText rejects newlines; ftlangdetect loads its model once
+            # on first use and keeps it for the process.
+            return ftdetect(text.replace("\n", " "), low_memory=True)["lang"]
+        except (OSError, ValueError):
+            # Model download or load failed; don't retry it on every message
+            FASTTEXT_AVAILABLE = False
+    try:
+        return detect(text)
+    except LangDetectException:
+        return "unknown"
 
 
 class TranslatorAgent:
     """Multilingual Translator Agent - Handles language detection and translation."""
 
     def __init__(self):
-        self.client = Groq(api_key=GROQ_API_KEY)
+        self.client = CLIENT
         self.model = "llama-3.3-70b-versatile"
         self.preferred_language = PREFERRED_LANGUAGE
-        self.language_names = {
-            "en": "English",
-            "es": "Spanish",
-            "fr": "French",
-            "de": "German",
-            "it": "Italian",
-            "pt": "Portuguese",
-            "ar": "Arabic",
-            "zh": "Chinese",
-            "ja": "Japanese",
-            "ko": "Korean",
-            "hi": "Hindi",
-            "ru": "Russian",
-        }
+        self.language_names = LANGUAGE_NAMES
 
     def detect_language(self, text: str) -> str:
         """Detect the language of incoming text."""
-        try:
-            return detect(text)
-        except:
-            return "unknown"
+        return detect_language(text)
 
-    def translate(self, message: str, target_language: str = None) -> dict:
-        """Translate message to target language."""
+    def translate(self, message: str, target_language: str = None, source_language: str = None) -> dict:
+        """Translate message to target language.
+
+        Pass source_language when it is already known to skip detection.
+        """
         if target_language is None:
             target_language = self.preferred_language
 
-        source_lang = self.detect_language(message)
+        source_lang = source_language or self.detect_language(message)
 
         if source_lang == target_language:
             return {
@@ -50,9 +103,10 @@ class TranslatorAgent:
 
         target_name = self.language_names.get(target_language, target_language)
 
-        response = self.client.chat.completions.create(
+        translated = chat(
+            self.client,
             model=self.model,
-            max_tokens=1024,
+            max_tokens=translation_budget(message),
             messages=[
                 {
                     "role": "user",
@@ -64,8 +118,6 @@ Message: {message}""",
             ],
         )
 
-        translated = response.choices[0].message.content
-
         return {
             "original": message,
             "translated": translated,
@@ -84,9 +136,10 @@ Message: {message}""",
 
         instruction = tone_instructions.get(tone, tone_instructions["professional"])
 
-        response = self.client.chat.completions.create(
+        return chat(
+            self.client,
             model=self.model,
-            max_tokens=1024,
+            max_tokens=max(200, translation_budget(message)),
             messages=[
                 {
                     "role": "user",
@@ -99,9 +152,7 @@ Message: {message}""",
             ],
         )
 
-        return response.choices[0].message.content
-
-    def translate_for_client(self, message: str, client_language: str) -> str:
+    def translate_for_client(self, message: str, client_language: str, source_language: str = None) -> str:
         """Translate your response back to the client's language."""
-        result = self.translate(message, target_language=client_language)
+        result = self.translate(message, target_language=client_language, source_language=source_language)
         return result["translated"]